@@ -4,15 +4,84 @@ Analyze Blu-ray disc photos and rename them based on identified movie titles.
 Uses Claude's vision API to identify movies from disc/case images.
 """
 
+import argparse
+import asyncio
 import base64
+import hashlib
+import json
 import os
 import re
 import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 
-from anthropic import Anthropic
-from PIL import Image
+from anthropic import (
+    DEFAULT_CONNECTION_LIMITS,
+    Anthropic,
+    APIError,
+    AsyncAnthropic,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    Timeout,
+)
+from anthropic.types.message_create_params import MessageCreateParamsNonStreaming
+from anthropic.types.messages.batch_create_params import Request
+import PIL
+from PIL import ExifTags, Image, ImageOps
+
+# Seconds to wait between Message Batches status checks
+BATCH_POLL_INTERVAL = 5
+
+# Give up waiting on a batch after this many status checks fail in a row
+MAX_BATCH_POLL_ERRORS = 5
+
+# Message Batches accept at most 100,000 requests and 256 MB per batch. The
+# size limit is kept well under 256 MB to leave room for the JSON around images
+MAX_BATCH_REQUESTS = 100_000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+# Maximum number of API requests in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+
+# HTTP settings for API clients. HTTP/2 multiplexes concurrent requests over one
+# connection, so each request doesn't pay for its own TCP and TLS handshake.
+# Limits/Timeout come from the SDK, as it may be built on httpx or httpx2
+HTTP_CLIENT_OPTIONS = {
+    'http2': True,
+    'limits': type(DEFAULT_CONNECTION_LIMITS)(max_connections=20, max_keepalive_connections=20),
+    'timeout': Timeout(60.0, connect=5.0),
+}
+
+# Maximum width/height of images sent to the API. Claude downscales anything
+# larger than this itself, so extra pixels only add upload size
+MAX_IMAGE_DIMENSION = 1568
+
+# Read buffer size for image files, large enough to cut down on read syscalls
+IMAGE_READ_BUFFER_SIZE = 1024 * 1024
+
+# Largest JPEG that is sent as-is when it needs no resizing or conversion
+MAX_PASSTHROUGH_BYTES = 2 * 1024 * 1024
+
+# Per-thread state, holding each worker thread's reusable preprocessing buffer
+_thread_local = threading.local()
+
+# Name of the file caching identified titles by image fingerprint
+TITLE_CACHE_FILENAME = 'cache.json'
+
+# Larger files are fingerprinted from this many bytes at each end plus their size
+FINGERPRINT_CHUNK_SIZE = 64 * 1024
+
+# Images whose 64-bit perceptual hashes differ in at most this many bits are
+# treated as photos of the same disc/case
+DUPLICATE_HASH_DISTANCE = 5
+
+# Translation table deleting characters that aren't allowed in filenames
+_INVALID_FILENAME_CHARS = str.maketrans('', '', '<>:"/\\|?*')
+_MULTIPLE_UNDERSCORES_RE = re.compile(r'_+')
 
 
 def sanitize_filename(title: str) -> str:
@@ -26,57 +95,94 @@ def sanitize_filename(title: str) -> str:
         A filesystem-safe filename in Title_Case format
     """
     # Remove or replace invalid characters
-    sanitized = re.sub(r'[<>:"/\\|?*]', '', title)
+    sanitized = title.translate(_INVALID_FILENAME_CHARS)
     # Replace spaces with underscores
     sanitized = sanitized.replace(' ', '_')
     # Remove multiple underscores
-    sanitized = re.sub(r'_+', '_', sanitized)
+    sanitized = _MULTIPLE_UNDERSCORES_RE.sub('_', sanitized)
     # Strip leading/trailing underscores
     sanitized = sanitized.strip('_')
     # Convert to Title Case (capitalize each word separated by underscores)
-    sanitized = '_'.join(word.capitalize() for word in sanitized.split('_'))
+    sanitized = '_'.join(map(str.capitalize, sanitized.split('_')))
     return sanitized
 
 
-def preprocess_image(image_path: Path) -> BytesIO:
+def preprocess_image(image_path: Path, output: BytesIO | None = None) -> BytesIO:
     """
     Preprocess an image for Claude API:
-    - Resize to max 2048px dimension
+    - Small upright RGB JPEGs are returned unchanged
+    - Rotate according to EXIF orientation
+    - Resize to max 1568px dimension
     - Convert to RGB
-    - Save as JPEG with quality=80 in memory
+    - Save as progressive JPEG with quality=80 in memory
 
     Args:
         image_path: Path to the image file
+        output: Buffer to write the image into, replacing its contents; a new
+            one is created if not given
 
     Returns:
         BytesIO object containing the preprocessed JPEG image
     """
-    # Open the image
-    img = Image.open(image_path)
+    if output is None:
+        output = BytesIO()
+    else:
+        output.seek(0)
+        output.truncate()
+
+    # Open the image with a large read buffer and decode it before the file closes
+    with open(image_path, 'rb', buffering=IMAGE_READ_BUFFER_SIZE) as fp:
+        img = Image.open(fp)
+
+        # Small upright RGB JPEGs are already fine to send, so skip the decode and re-encode
+        if (
+            img.format == 'JPEG'
+            and img.mode == 'RGB'
+            and max(img.size) <= MAX_IMAGE_DIMENSION
+            and os.fstat(fp.fileno()).st_size <= MAX_PASSTHROUGH_BYTES
+            and img.getexif().get(ExifTags.Base.Orientation, 1) == 1
+        ):
+            fp.seek(0)
+            shutil.copyfileobj(fp, output)
+            output.seek(0)
+            return output
+
+        # Let libjpeg downscale large JPEGs while decoding. draft() never goes
+        # below the requested size, so the resize below still gives the exact size
+        if img.format == 'JPEG' and max(img.size) > MAX_IMAGE_DIMENSION:
+            ratio = MAX_IMAGE_DIMENSION / max(img.size)
+            img.draft('RGB', tuple(round(dim * ratio) for dim in img.size))
+
+        img.load()
+
+    # Rotate/flip photos so they're upright according to their EXIF orientation
+    ImageOps.exif_transpose(img, in_place=True)
 
     # Convert to RGB if needed (handles PNG with transparency, RGBA, etc.)
     if img.mode != 'RGB':
-        # If image has transparency, paste it on white background
+        # If image has transparency, composite it onto a white background
         if img.mode in ('RGBA', 'LA', 'PA'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
             if img.mode == 'PA':
                 img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
+            # Fully opaque images don't need a background at all
+            if img.getchannel('A').getextrema()[0] == 255:
+                img = img.convert('RGB')
+            else:
+                background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+                img = Image.alpha_composite(background, img.convert('RGBA')).convert('RGB')
         else:
             img = img.convert('RGB')
 
-    # Resize if larger than 2048px in any dimension
-    max_dimension = 2048
-    if max(img.size) > max_dimension:
+    # Resize if larger than MAX_IMAGE_DIMENSION in any dimension
+    if max(img.size) > MAX_IMAGE_DIMENSION:
         # Calculate new size maintaining aspect ratio
-        ratio = max_dimension / max(img.size)
-        new_size = tuple(int(dim * ratio) for dim in img.size)
+        ratio = MAX_IMAGE_DIMENSION / max(img.size)
+        new_size = tuple(round(dim * ratio) for dim in img.size)
         img = img.resize(new_size, Image.Resampling.LANCZOS)
 
-    # Save to BytesIO as JPEG with quality=80
-    output = BytesIO()
-    img.save(output, format='JPEG', quality=80, optimize=True)
+    # Save to BytesIO as progressive JPEG with quality=80, which is smaller than
+    # baseline at the same quality
+    img.save(output, format='JPEG', quality=80, optimize=True, progressive=True)
     output.seek(0)
 
     return output
@@ -92,34 +198,42 @@ def encode_image_from_bytes(image_bytes: BytesIO) -> str:
     Returns:
         Base64 encoded string of the image
     """
-    return base64.standard_b64encode(image_bytes.getvalue()).decode('utf-8')
+    # getbuffer() exposes the data without copying it the way getvalue() does
+    with image_bytes.getbuffer() as image_buffer:
+        return base64.standard_b64encode(image_buffer).decode('ascii')
 
 
-def identify_movie(client: Anthropic, image_path: Path) -> str:
+def preprocess_and_encode(image_path: Path) -> str:
     """
-    Use Claude's vision API to identify the movie from a Blu-ray disc/case image.
+    Preprocess an image for Claude API and encode it to base64.
 
     Args:
-        client: Anthropic client instance
         image_path: Path to the image file
 
     Returns:
-        The identified movie title
+        Base64 encoded string of the preprocessed JPEG image
     """
-    print(f"Analyzing {image_path.name}...")
+    # Each thread reuses one buffer, as nothing refers to it once encoded
+    buffer = getattr(_thread_local, 'buffer', None)
+    if buffer is None:
+        buffer = _thread_local.buffer = BytesIO()
+    return encode_image_from_bytes(preprocess_image(image_path, buffer))
 
-    # Preprocess the image
-    print(f"  Preprocessing image...")
-    preprocessed_image = preprocess_image(image_path)
 
-    # Encode the preprocessed image
-    image_data = encode_image_from_bytes(preprocessed_image)
+def build_message_params(image_data: str) -> MessageCreateParamsNonStreaming:
+    """
+    Build the Messages API parameters for identifying a movie from an image.
 
-    # Call Claude API with preprocessed JPEG
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
-        messages=[
+    Args:
+        image_data: Base64 encoded JPEG image
+
+    Returns:
+        Parameters for a single (non-streaming) messages request
+    """
+    return {
+        "model": "claude-sonnet-4-20250514",
+        "max_tokens": 1024,
+        "messages": [
             {
                 "role": "user",
                 "content": [
@@ -138,15 +252,436 @@ def identify_movie(client: Anthropic, image_path: Path) -> str:
                 ],
             }
         ],
-    )
+    }
+
+
+async def identify_movie(
+    client: AsyncAnthropic, image_path: Path, image_data: str | None = None
+) -> str:
+    """
+    Use Claude's vision API to identify the movie from a Blu-ray disc/case image.
+
+    Args:
+        client: Async Anthropic client instance
+        image_path: Path to the image file
+        image_data: Already preprocessed and encoded image, if available;
+            otherwise the image is preprocessed in the event loop's default executor
+
+    Returns:
+        The identified movie title
+    """
+    print(f"Analyzing {image_path.name}...")
+
+    # Preprocess and encode the image off the event loop
+    if image_data is None:
+        loop = asyncio.get_running_loop()
+        image_data = await loop.run_in_executor(None, preprocess_and_encode, image_path)
+
+    # Call Claude API with preprocessed JPEG
+    message = await client.messages.create(**build_message_params(image_data))
 
     # Extract the movie title from the response
     title = message.content[0].text.strip()
-    print(f"  Identified as: {title}")
+    print(f"{image_path.name} identified as: {title}")
     return title
 
 
-def process_photos(process_dir: Path, renamed_dir: Path, original_dir: Path, api_key: str) -> None:
+async def identify_movies(api_key: str, image_paths: list[Path]) -> dict[Path, str]:
+    """
+    Identify movies for many images concurrently.
+
+    Every image is queued for preprocessing in a thread pool up-front, so
+    preprocessing runs across all cores while earlier images are waiting on
+    the API. Up to MAX_CONCURRENT_REQUESTS API requests are in flight at once.
+
+    Args:
+        api_key: Anthropic API key
+        image_paths: Paths to the image files
+
+    Returns:
+        Mapping of image path to identified movie title for each image that
+        was identified successfully
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    loop = asyncio.get_running_loop()
+
+    http_client = DefaultAsyncHttpxClient(**HTTP_CLIENT_OPTIONS)
+    async with AsyncAnthropic(api_key=api_key, http_client=http_client) as client:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            encoded = {
+                image_path: loop.run_in_executor(executor, preprocess_and_encode, image_path)
+                for image_path in image_paths
+            }
+
+            async def worker(image_path: Path) -> str:
+                image_data = await encoded[image_path]
+                async with semaphore:
+                    return await identify_movie(client, image_path, image_data)
+
+            results = await asyncio.gather(
+                *(worker(image_path) for image_path in image_paths),
+                return_exceptions=True,
+            )
+
+    titles: dict[Path, str] = {}
+    for image_path, result in zip(image_paths, results):
+        if isinstance(result, Exception):
+            print(f"  Error processing {image_path.name}: {result}")
+        else:
+            titles[image_path] = result
+    print()
+
+    return titles
+
+
+def fingerprint_image(image_path: Path) -> str:
+    """
+    Compute a content fingerprint for an image file.
+
+    Small files are hashed in full. Larger files are hashed from their first
+    and last FINGERPRINT_CHUNK_SIZE bytes plus their size, which is enough to
+    tell photos apart without reading them entirely.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Hex digest identifying the file's contents
+    """
+    size = image_path.stat().st_size
+    digest = hashlib.blake2b(str(size).encode('ascii'), digest_size=16)
+    with open(image_path, 'rb') as fp:
+        if size <= 2 * FINGERPRINT_CHUNK_SIZE:
+            digest.update(fp.read())
+        else:
+            digest.update(fp.read(FINGERPRINT_CHUNK_SIZE))
+            fp.seek(-FINGERPRINT_CHUNK_SIZE, os.SEEK_END)
+            digest.update(fp.read(FINGERPRINT_CHUNK_SIZE))
+    return digest.hexdigest()
+
+
+def load_title_cache(cache_path: Path) -> dict[str, str]:
+    """
+    Load cached movie titles from a previous run.
+
+    Args:
+        cache_path: Path to the cache file
+
+    Returns:
+        Mapping of image fingerprint to movie title (empty if there is no
+        usable cache)
+    """
+    try:
+        return json.loads(cache_path.read_text())
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable title cache {cache_path}: {e}")
+        return {}
+
+
+def save_title_cache(cache_path: Path, cache: dict[str, str]) -> None:
+    """
+    Save cached movie titles, replacing the cache file atomically.
+
+    Args:
+        cache_path: Path to the cache file
+        cache: Mapping of image fingerprint to movie title
+    """
+    # Write to a temporary file first so an interrupted run can't leave a partial cache
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(cache, fp, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def perceptual_hash(image_path: Path) -> int:
+    """
+    Compute a 64-bit perceptual (difference) hash of an image.
+
+    The image is shrunk to a 9x8 grayscale thumbnail and each bit records
+    whether a pixel is brighter than its right-hand neighbour, so resized,
+    recompressed or slightly shifted copies of a photo hash to nearly the
+    same value.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        The hash as an integer
+    """
+    with Image.open(image_path) as img:
+        # Only a tiny thumbnail is needed, so let libjpeg decode at reduced size
+        img.draft('L', (64, 64))
+        pixels = img.convert('L').resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def find_duplicate_images(image_paths: list[Path]) -> dict[Path, Path]:
+    """
+    Group near-identical photos, such as burst shots of the same case.
+
+    Images are hashed in parallel, then each image joins the group of the
+    first earlier image within DUPLICATE_HASH_DISTANCE bits of it.
+
+    Args:
+        image_paths: Paths to the image files
+
+    Returns:
+        Mapping of each image path to the first image of its group (itself
+        if it isn't a duplicate)
+    """
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(perceptual_hash, image_path) for image_path in image_paths]
+
+    representatives: dict[Path, Path] = {}
+    group_hashes: list[tuple[Path, int]] = []
+    for image_path, future in zip(image_paths, futures):
+        try:
+            image_hash = future.result()
+        except Exception:
+            # Leave unreadable images on their own, they'll be reported when identified
+            representatives[image_path] = image_path
+            continue
+
+        for group_path, group_hash in group_hashes:
+            if (image_hash ^ group_hash).bit_count() <= DUPLICATE_HASH_DISTANCE:
+                representatives[image_path] = group_path
+                break
+        else:
+            group_hashes.append((image_path, image_hash))
+            representatives[image_path] = image_path
+
+    return representatives
+
+
+def submit_batch(client: Anthropic, requests: list[Request]) -> str | None:
+    """
+    Submit requests as one Message Batches job.
+
+    Args:
+        client: Anthropic client instance
+        requests: Requests to submit
+
+    Returns:
+        The batch ID, or None if the batch couldn't be submitted
+    """
+    try:
+        batch = client.messages.batches.create(requests=requests)
+    except APIError as e:
+        print(f"  Error submitting batch of {len(requests)} images: {e}")
+        return None
+
+    print(f"Submitted batch {batch.id} with {len(requests)} images")
+    return batch.id
+
+
+def collect_batch_results(
+    client: Anthropic, batch_id: str, paths_by_id: dict[str, Path]
+) -> dict[Path, str]:
+    """
+    Wait for a Message Batches job to end and collect its identified titles.
+
+    Args:
+        client: Anthropic client instance
+        batch_id: ID of the submitted batch
+        paths_by_id: Mapping of request custom ID to image path
+
+    Returns:
+        Mapping of image path to identified movie title for each request in
+        the batch that succeeded
+    """
+    # Keep polling through occasional API errors, the batch carries on regardless
+    poll_errors = 0
+    while True:
+        try:
+            if client.messages.batches.retrieve(batch_id).processing_status == "ended":
+                break
+            poll_errors = 0
+        except APIError as e:
+            poll_errors += 1
+            print(f"  Error checking batch {batch_id}: {e}")
+            if poll_errors >= MAX_BATCH_POLL_ERRORS:
+                print(f"  Gave up waiting for batch {batch_id}; its results can still be retrieved later")
+                return {}
+        time.sleep(BATCH_POLL_INTERVAL)
+
+    # Results may come back in any order, so match them up by custom ID
+    titles: dict[Path, str] = {}
+    try:
+        for response in client.messages.batches.results(batch_id):
+            image_path = paths_by_id[response.custom_id]
+            if response.result.type == "succeeded":
+                title = response.result.message.content[0].text.strip()
+                print(f"{image_path.name} identified as: {title}")
+                titles[image_path] = title
+            else:
+                print(f"  Error processing {image_path.name}: batch request {response.result.type}")
+    except APIError as e:
+        print(f"  Error reading results of batch {batch_id}; they can still be retrieved later: {e}")
+
+    return titles
+
+
+def batch_identify_movies(client: Anthropic, image_paths: list[Path]) -> dict[Path, str]:
+    """
+    Identify movies for many images at once using the Message Batches API.
+
+    Images are preprocessed in a thread pool and submitted as batch jobs,
+    starting a new batch whenever the next image would take one over
+    MAX_BATCH_REQUESTS or MAX_BATCH_BYTES. Each batch is then polled until
+    processing has ended.
+
+    Args:
+        client: Anthropic client instance
+        image_paths: Paths to the image files
+
+    Returns:
+        Mapping of image path to identified movie title for each image that
+        was identified successfully
+    """
+    # Batch custom IDs only allow [a-zA-Z0-9_-], so map indexed IDs back to paths
+    paths_by_id: dict[str, Path] = {}
+    batch_ids: list[str] = []
+    requests: list[Request] = []
+    requests_bytes = 0
+
+    def submit_requests() -> None:
+        batch_id = submit_batch(client, requests)
+        if batch_id is not None:
+            batch_ids.append(batch_id)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        encoded = [executor.submit(preprocess_and_encode, image_path) for image_path in image_paths]
+        for index, (image_path, future) in enumerate(zip(image_paths, encoded)):
+            print(f"Preprocessing {image_path.name}...")
+            try:
+                image_data = future.result()
+            except Exception as e:
+                print(f"  Error processing {image_path.name}: {e}")
+                continue
+
+            # Submit the current batch once it's full, then start the next one
+            if requests and (
+                len(requests) >= MAX_BATCH_REQUESTS
+                or requests_bytes + len(image_data) > MAX_BATCH_BYTES
+            ):
+                submit_requests()
+                requests = []
+                requests_bytes = 0
+
+            custom_id = f"image-{index}"
+            paths_by_id[custom_id] = image_path
+            requests.append(Request(custom_id=custom_id, params=build_message_params(image_data)))
+            requests_bytes += len(image_data)
+
+    if requests:
+        submit_requests()
+
+    # Wait for every batch and gather their results
+    titles: dict[Path, str] = {}
+    if batch_ids:
+        print("\nWaiting for batch results...")
+    for batch_id in batch_ids:
+        titles.update(collect_batch_results(client, batch_id, paths_by_id))
+    print()
+
+    return titles
+
+
+def next_free_filename(stem: str, extension: str, taken: set[str]) -> str:
+    """
+    Pick the first unused filename of stem, stem_1, stem_2, ... and claim it.
+
+    Args:
+        stem: Filename without extension
+        extension: File extension, including the dot
+        taken: Casefolded names already in use, updated with the chosen name
+
+    Returns:
+        The chosen filename
+    """
+    # Compare casefolded names so case-insensitive filesystems can't overwrite files
+    filename = f"{stem}{extension}"
+    counter = 1
+    while filename.casefold() in taken:
+        filename = f"{stem}_{counter}{extension}"
+        counter += 1
+    taken.add(filename.casefold())
+    return filename
+
+
+def rename_photo(
+    image_path: Path,
+    movie_title: str,
+    renamed_dir: Path,
+    original_dir: Path,
+    renamed_names: set[str],
+    original_names: set[str],
+    hardlink_original: bool = False,
+) -> None:
+    """
+    Back up a photo and move it into the renamed directory under its movie title.
+
+    Args:
+        image_path: Path to the image file
+        movie_title: The identified movie title
+        renamed_dir: Directory to save renamed photos
+        original_dir: Directory to save original photos
+        renamed_names: Casefolded names already used in renamed_dir
+        original_names: Casefolded names already used in original_dir
+        hardlink_original: Back up the original as a hard link instead of a copy
+            when both directories are on the same filesystem
+    """
+    # Sanitize the title for filename
+    safe_title = sanitize_filename(movie_title)
+
+    # Create new filename (always .jpg for renamed, keep original extension for backup),
+    # handling duplicate filenames in each directory
+    new_filename = next_free_filename(safe_title, '.jpg', renamed_names)
+    new_path = renamed_dir / new_filename
+    original_filename = next_free_filename(safe_title, image_path.suffix, original_names)
+    original_path = original_dir / original_filename
+
+    # Copy original file to original_images (a hard link copies no data at all)
+    if hardlink_original:
+        try:
+            os.link(image_path, original_path)
+        except FileExistsError:
+            raise
+        except OSError:
+            # Different filesystem, or hard links aren't supported there
+            shutil.copy2(image_path, original_path)
+    else:
+        shutil.copy2(image_path, original_path)
+    print(f"  Saved original as: {original_filename}")
+
+    # Move processed file to renamed directory
+    image_path.rename(new_path)
+    print(f"  Renamed to: {new_filename}\n")
+
+
+def process_photos(
+    process_dir: Path,
+    renamed_dir: Path,
+    original_dir: Path,
+    api_key: str,
+    use_batch: bool = False,
+    cache_path: Path | None = None,
+    hardlink_originals: bool = False,
+    dedupe: bool = False,
+) -> None:
     """
     Process all photos in the process directory.
 
@@ -155,16 +690,23 @@ def process_photos(process_dir: Path, renamed_dir: Path, original_dir: Path, api
         renamed_dir: Directory to save renamed photos
         original_dir: Directory to save original photos
         api_key: Anthropic API key
+        use_batch: Submit all images as one Message Batches job (half the cost,
+            but results can take a while) instead of concurrent requests
+        cache_path: File caching identified titles between runs (defaults to
+            TITLE_CACHE_FILENAME next to renamed_dir)
+        hardlink_originals: Back up originals as hard links instead of copies
+            where possible. The backup and renamed photo then share one file on disk
+        dedupe: Only identify one photo from each group of near-identical
+            photos and give the rest of the group the same title
     """
-    # Initialize Anthropic client
-    client = Anthropic(api_key=api_key)
-
     # Get all image files from the process directory
     image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif'}
-    image_files = [
-        f for f in process_dir.iterdir()
-        if f.is_file() and f.suffix.lower() in image_extensions
-    ]
+    # scandir entries cache their file type, so is_file() doesn't need a stat() per file
+    with os.scandir(process_dir) as entries:
+        image_files = sorted(
+            Path(entry.path) for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in image_extensions
+        )
 
     if not image_files:
         print(f"No image files found in {process_dir}")
@@ -172,52 +714,108 @@ def process_photos(process_dir: Path, renamed_dir: Path, original_dir: Path, api
 
     print(f"Found {len(image_files)} images to process\n")
 
-    # Process each image
-    for image_path in sorted(image_files):
+    # Reuse titles for images identified in an earlier run
+    if cache_path is None:
+        cache_path = renamed_dir.parent / TITLE_CACHE_FILENAME
+    cache = load_title_cache(cache_path)
+    fingerprints: dict[Path, str] = {}
+    for image_path in image_files:
         try:
-            # Identify the movie
-            movie_title = identify_movie(client, image_path)
-
-            # Sanitize the title for filename
-            safe_title = sanitize_filename(movie_title)
-
-            # Create new filename (always .jpg for renamed, keep original extension for backup)
-            new_filename = f"{safe_title}.jpg"
-            new_path = renamed_dir / new_filename
-
-            # Handle duplicate filenames in renamed directory
-            counter = 1
-            while new_path.exists():
-                new_filename = f"{safe_title}_{counter}.jpg"
-                new_path = renamed_dir / new_filename
-                counter += 1
-
-            # Copy original to original_images directory with same naming scheme
-            original_filename = f"{safe_title}{image_path.suffix}"
-            original_path = original_dir / original_filename
-
-            # Handle duplicate filenames in original directory
-            counter = 1
-            while original_path.exists():
-                original_filename = f"{safe_title}_{counter}{image_path.suffix}"
-                original_path = original_dir / original_filename
-                counter += 1
-
-            # Copy original file to original_images
-            shutil.copy2(image_path, original_path)
-            print(f"  Saved original as: {original_filename}")
+            fingerprints[image_path] = fingerprint_image(image_path)
+        except OSError as e:
+            print(f"  Error fingerprinting {image_path.name}, it won't be cached: {e}")
+    cached_titles = {
+        image_path: cache[fingerprint]
+        for image_path, fingerprint in fingerprints.items()
+        if fingerprint in cache
+    }
+    for image_path, movie_title in cached_titles.items():
+        print(f"{image_path.name} identified as: {movie_title} (cached)")
+    uncached_files = [image_path for image_path in image_files if image_path not in cached_titles]
+
+    # Only send the first of each group of near-identical photos to the API
+    representatives = {image_path: image_path for image_path in uncached_files}
+    if dedupe and uncached_files:
+        representatives = find_duplicate_images(uncached_files)
+        for image_path, representative in representatives.items():
+            if representative != image_path:
+                print(f"{image_path.name} is a duplicate of {representative.name}")
+    files_to_identify = [
+        image_path for image_path in uncached_files if representatives[image_path] == image_path
+    ]
 
-            # Move processed file to renamed directory
-            image_path.rename(new_path)
-            print(f"  Renamed to: {new_filename}\n")
+    # Identify every remaining image first
+    identified: dict[Path, str] = {}
+    if use_batch and files_to_identify:
+        with Anthropic(api_key=api_key, http_client=DefaultHttpxClient(**HTTP_CLIENT_OPTIONS)) as client:
+            identified = batch_identify_movies(client, files_to_identify)
+    elif files_to_identify:
+        identified = asyncio.run(identify_movies(api_key, files_to_identify))
+    new_titles = {
+        image_path: identified[representative]
+        for image_path, representative in representatives.items()
+        if representative in identified
+    }
+
+    # Don't cache failed identifications so they are retried next time
+    if new_titles:
+        cache.update(
+            (fingerprints[image_path], movie_title)
+            for image_path, movie_title in new_titles.items()
+            if movie_title != 'Unknown' and image_path in fingerprints
+        )
+        # A cache that can't be saved shouldn't stop the photos being renamed
+        try:
+            save_title_cache(cache_path, cache)
+        except OSError as e:
+            print(f"Could not save title cache {cache_path}: {e}")
+
+    # Then back up and rename each identified image, in order, checking for
+    # duplicate filenames against one listing of each directory
+    titles = cached_titles | new_titles
+    renamed_names = {name.casefold() for name in os.listdir(renamed_dir)}
+    original_names = {name.casefold() for name in os.listdir(original_dir)}
+    for image_path in image_files:
+        movie_title = titles.get(image_path)
+        if movie_title is None:
+            continue
 
+        print(f"Renaming {image_path.name}...")
+        try:
+            rename_photo(
+                image_path,
+                movie_title,
+                renamed_dir,
+                original_dir,
+                renamed_names,
+                original_names,
+                hardlink_original=hardlink_originals,
+            )
         except Exception as e:
             print(f"  Error processing {image_path.name}: {e}\n")
             continue
 
 
-def main():
+def main(argv: list[str] | None = None):
     """Main entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Submit all photos as one Message Batches job (half the API cost, slower results)',
+    )
+    parser.add_argument(
+        '--hardlink-originals',
+        action='store_true',
+        help='Back up originals as hard links instead of copies when on the same filesystem',
+    )
+    parser.add_argument(
+        '--dedupe',
+        action='store_true',
+        help='Identify only one photo from each group of near-identical photos',
+    )
+    args = parser.parse_args(argv)
+
     # Get API key from environment (Doppler will inject this)
     api_key = os.environ.get('CLAUDE_API')
     if not api_key:
@@ -242,11 +840,20 @@ def main():
     print(f"Process directory: {process_dir}")
     print(f"Renamed directory: {renamed_dir}")
     print(f"Original images directory: {original_dir}")
+    print(f"Pillow version: {PIL.__version__}")
     print("=" * 60)
     print()
 
     # Process all photos
-    process_photos(process_dir, renamed_dir, original_dir, api_key)
+    process_photos(
+        process_dir,
+        renamed_dir,
+        original_dir,
+        api_key,
+        use_batch=args.batch,
+        hardlink_originals=args.hardlink_originals,
+        dedupe=args.dedupe,
+    )
 
     print("=" * 60)
     print("Processing complete!")
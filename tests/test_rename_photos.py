@@ -1,19 +1,37 @@
 """Unit tests for rename_photos module."""
 
+import asyncio
 import base64
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import BytesIO
 from pathlib import Path
 from unittest.mock import MagicMock
 
+import anthropic
 import pytest
-from PIL import Image
+from PIL import Image, JpegImagePlugin
 
 from rename_photos_ai.rename_photos import (
+    HTTP_CLIENT_OPTIONS,
+    batch_identify_movies,
+    build_message_params,
     encode_image_from_bytes,
+    find_duplicate_images,
+    fingerprint_image,
     identify_movie,
+    identify_movies,
+    load_title_cache,
+    next_free_filename,
+    perceptual_hash,
+    rename_photo,
+    preprocess_and_encode,
     preprocess_image,
     process_photos,
     sanitize_filename,
+    save_title_cache,
 )
 
 
@@ -26,6 +44,15 @@ def mock_anthropic_client(mocker):
     return mock_client
 
 
+@pytest.fixture
+def mock_async_anthropic_client(mocker):
+    """Create a mock AsyncAnthropic client with an awaitable messages.create."""
+    mock_client = mocker.MagicMock()
+    mock_client.messages = mocker.MagicMock()
+    mock_client.messages.create = mocker.AsyncMock()
+    return mock_client
+
+
 @pytest.fixture
 def mock_image(mocker):
     """Create a mock PIL Image with autospec."""
@@ -84,6 +111,16 @@ class TestSanitizeFilename:
                 "Uppercase_Movie",
                 id="all_uppercase"
             ),
+            pytest.param(
+                "Ocean's 11",
+                "Ocean's_11",
+                id="title_with_apostrophe"
+            ),
+            pytest.param(
+                "2fast 2furious",
+                "2fast_2furious",
+                id="words_starting_with_digits"
+            ),
         ],
     )
     def test_sanitize_filename(self, title, expected):
@@ -92,6 +129,30 @@ class TestSanitizeFilename:
         assert result == expected
 
 
+class TestNextFreeFilename:
+    """Tests for next_free_filename function."""
+
+    @pytest.mark.parametrize(
+        "taken,expected",
+        [
+            pytest.param(set(), "The_Matrix.jpg", id="unused_name"),
+            pytest.param({"the_matrix.jpg"}, "The_Matrix_1.jpg", id="name_taken"),
+            pytest.param(
+                {"the_matrix.jpg", "the_matrix_1.jpg", "the_matrix_2.jpg"},
+                "The_Matrix_3.jpg",
+                id="several_names_taken"
+            ),
+            pytest.param({"the_matrix.png"}, "The_Matrix.jpg", id="other_extension_taken"),
+        ],
+    )
+    def test_next_free_filename(self, taken, expected):
+        """Test that the first unused name is chosen and claimed."""
+        result = next_free_filename("The_Matrix", ".jpg", taken)
+
+        assert result == expected
+        assert expected.casefold() in taken
+
+
 class TestEncodeImageFromBytes:
     """Tests for encode_image_from_bytes function."""
 
@@ -119,6 +180,36 @@ class TestEncodeImageFromBytes:
         assert result == base64.standard_b64encode(image_data).decode('utf-8')
 
 
+class TestPreprocessAndEncode:
+    """Tests for preprocess_and_encode function."""
+
+    def test_preprocess_and_encode(self, tmp_path):
+        """Test that the image is preprocessed to JPEG and base64 encoded."""
+        test_path = tmp_path / "test.png"
+        Image.new('RGBA', (3000, 1500), (0, 128, 255, 128)).save(test_path)
+
+        result = preprocess_and_encode(test_path)
+
+        with Image.open(BytesIO(base64.standard_b64decode(result))) as decoded:
+            assert decoded.format == 'JPEG'
+            assert decoded.size == (1568, 784)
+            assert decoded.info.get('progressive')
+
+    def test_preprocess_and_encode_reuses_buffer(self, tmp_path):
+        """Test that reusing the thread's buffer doesn't leak data between images."""
+        large_path = tmp_path / "large.png"
+        small_path = tmp_path / "small.png"
+        Image.effect_noise((1000, 1000), 64).save(large_path)
+        Image.new('L', (10, 10), 128).save(small_path)
+
+        preprocess_and_encode(large_path)
+        result = preprocess_and_encode(small_path)
+
+        with Image.open(BytesIO(base64.standard_b64decode(result))) as decoded:
+            assert decoded.size == (10, 10)
+            decoded.load()
+
+
 class TestPreprocessImage:
     """Tests for preprocess_image function."""
 
@@ -128,27 +219,66 @@ class TestPreprocessImage:
         mock_img = mocker.MagicMock(spec=Image.Image)
         mock_img.mode = 'RGBA'
         mock_img.size = (1000, 1000)
-        mock_img.split.return_value = [None, None, None, mocker.MagicMock()]
         mock_open.return_value = mock_img
 
         mock_background = mocker.MagicMock(spec=Image.Image)
-        mock_background.size = (1000, 1000)
-        mock_background.save = mocker.MagicMock()
         mock_new = mocker.patch('rename_photos_ai.rename_photos.Image.new', return_value=mock_background)
 
+        mock_composited = mocker.MagicMock(spec=Image.Image)
+        mock_flattened = mocker.MagicMock(spec=Image.Image)
+        mock_flattened.size = (1000, 1000)
+        mock_composited.convert.return_value = mock_flattened
+        mock_composite = mocker.patch(
+            'rename_photos_ai.rename_photos.Image.alpha_composite', return_value=mock_composited
+        )
+
         test_path = tmp_path / "test.png"
         test_path.touch()
 
         result = preprocess_image(test_path)
 
         assert isinstance(result, BytesIO)
-        mock_open.assert_called_once_with(test_path)
-        mock_new.assert_called_once_with('RGB', (1000, 1000), (255, 255, 255))
-        mock_background.paste.assert_called_once()
-        mock_background.save.assert_called_once()
+        mock_open.assert_called_once()
+        assert mock_open.call_args[0][0].name == str(test_path)
+        mock_img.load.assert_called()
+        mock_new.assert_called_once_with('RGBA', (1000, 1000), (255, 255, 255, 255))
+        mock_composite.assert_called_once_with(mock_background, mock_img.convert.return_value)
+        mock_composited.convert.assert_called_once_with('RGB')
+        mock_flattened.save.assert_called_once()
+
+    @pytest.mark.parametrize(
+        "mode,color",
+        [
+            pytest.param('RGBA', (0, 0, 0, 0), id="rgba"),
+            pytest.param('LA', (0, 0), id="la"),
+        ],
+    )
+    def test_preprocess_image_transparent_on_white(self, tmp_path, mode, color):
+        """Test that fully transparent pixels come out white."""
+        test_path = tmp_path / "test.png"
+        Image.new(mode, (100, 100), color).save(test_path)
+
+        result = preprocess_image(test_path)
+
+        with Image.open(result) as output:
+            assert output.mode == 'RGB'
+            assert all(channel >= 250 for channel in output.getpixel((50, 50)))
+
+    def test_preprocess_image_opaque_alpha_skips_composite(self, mocker, tmp_path):
+        """Test that images with a fully opaque alpha channel are converted directly."""
+        test_path = tmp_path / "test.png"
+        Image.new('RGBA', (100, 100), (10, 20, 30, 255)).save(test_path)
+        spy_composite = mocker.spy(Image, 'alpha_composite')
+
+        result = preprocess_image(test_path)
+
+        spy_composite.assert_not_called()
+        with Image.open(result) as output:
+            assert output.mode == 'RGB'
+            assert all(abs(a - b) <= 5 for a, b in zip(output.getpixel((50, 50)), (10, 20, 30)))
 
     def test_preprocess_image_resize_large_image(self, mocker, tmp_path):
-        """Test that large images are resized to 2048px max dimension."""
+        """Test that large images are resized to 1568px max dimension."""
         mock_open = mocker.patch('rename_photos_ai.rename_photos.Image.open')
         mock_img = mocker.MagicMock(spec=Image.Image)
         mock_img.mode = 'RGB'
@@ -164,10 +294,60 @@ class TestPreprocessImage:
 
         assert isinstance(result, BytesIO)
         mock_img.resize.assert_called_once()
-        # Check that resize was called with correct dimensions (2048, 1536)
+        # Check that resize was called with correct dimensions (1568, 1176)
         called_size = mock_img.resize.call_args[0][0]
-        assert called_size[0] == 2048
-        assert called_size[1] == 1536
+        assert called_size[0] == 1568
+        assert called_size[1] == 1176
+
+    def test_preprocess_image_large_jpeg_uses_draft(self, mocker, tmp_path):
+        """Test that large JPEGs are downscaled during decode before resizing."""
+        test_path = tmp_path / "test.jpg"
+        Image.new('RGB', (4400, 3300), (200, 30, 30)).save(test_path, format='JPEG')
+        spy_draft = mocker.spy(JpegImagePlugin.JpegImageFile, 'draft')
+
+        result = preprocess_image(test_path)
+
+        spy_draft.assert_called_once()
+        with Image.open(result) as output:
+            assert output.size == (1568, 1176)
+
+    def test_preprocess_image_small_jpeg_passthrough(self, mocker, tmp_path):
+        """Test that small RGB JPEGs are returned without being re-encoded."""
+        test_path = tmp_path / "test.jpg"
+        Image.new('RGB', (1000, 800), (10, 20, 30)).save(test_path, format='JPEG', quality=95)
+        spy_save = mocker.spy(Image.Image, 'save')
+
+        result = preprocess_image(test_path)
+
+        assert result.getvalue() == test_path.read_bytes()
+        spy_save.assert_not_called()
+
+    def test_preprocess_image_exif_orientation(self, mocker, tmp_path):
+        """Test that rotated photos are made upright instead of passed through."""
+        test_path = tmp_path / "test.jpg"
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        Image.new('RGB', (1000, 800), (10, 20, 30)).save(test_path, format='JPEG', exif=exif)
+
+        result = preprocess_image(test_path)
+
+        assert result.getvalue() != test_path.read_bytes()
+        with Image.open(result) as output:
+            assert output.size == (800, 1000)
+            assert output.getexif().get(0x0112) is None
+
+    def test_preprocess_image_reuses_output_buffer(self, tmp_path):
+        """Test that an existing buffer's contents are replaced."""
+        test_path = tmp_path / "test.png"
+        Image.new('RGB', (10, 10), (10, 20, 30)).save(test_path)
+        buffer = BytesIO(b'x' * 100000)
+
+        result = preprocess_image(test_path, buffer)
+
+        assert result is buffer
+        assert result.tell() == 0
+        assert result.getvalue().startswith(b'\xff\xd8')
+        assert len(result.getvalue()) < 100000
 
     def test_preprocess_image_no_resize_small_image(self, mocker, tmp_path):
         """Test that small images are not resized."""
@@ -190,7 +370,7 @@ class TestPreprocessImage:
 class TestIdentifyMovie:
     """Tests for identify_movie function."""
 
-    def test_identify_movie_success(self, mocker, mock_anthropic_client, tmp_path):
+    def test_identify_movie_success(self, mocker, mock_async_anthropic_client, tmp_path):
         """Test successful movie identification."""
         # Mock preprocess_image
         mock_preprocess = mocker.patch('rename_photos_ai.rename_photos.preprocess_image')
@@ -206,17 +386,34 @@ class TestIdentifyMovie:
         mock_content = mocker.MagicMock()
         mock_content.text = "The Matrix"
         mock_response.content = [mock_content]
-        mock_anthropic_client.messages.create.return_value = mock_response
+        mock_async_anthropic_client.messages.create.return_value = mock_response
 
         test_path = tmp_path / "test.jpg"
         test_path.touch()
 
-        result = identify_movie(mock_anthropic_client, test_path)
+        result = asyncio.run(identify_movie(mock_async_anthropic_client, test_path))
 
         assert result == "The Matrix"
-        mock_preprocess.assert_called_once_with(test_path)
+        mock_preprocess.assert_called_once_with(test_path, mocker.ANY)
         mock_encode.assert_called_once_with(mock_bytes)
-        mock_anthropic_client.messages.create.assert_called_once()
+        mock_async_anthropic_client.messages.create.assert_called_once()
+
+    def test_identify_movie_already_preprocessed(self, mocker, mock_async_anthropic_client, tmp_path):
+        """Test that an already preprocessed image is not preprocessed again."""
+        mock_preprocess = mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+
+        mock_content = mocker.MagicMock()
+        mock_content.text = "The Matrix"
+        mock_async_anthropic_client.messages.create.return_value.content = [mock_content]
+
+        result = asyncio.run(
+            identify_movie(mock_async_anthropic_client, tmp_path / "test.jpg", 'encoded')
+        )
+
+        assert result == "The Matrix"
+        mock_preprocess.assert_not_called()
+        create_kwargs = mock_async_anthropic_client.messages.create.call_args.kwargs
+        assert create_kwargs['messages'][0]['content'][0]['source']['data'] == 'encoded'
 
     @pytest.mark.parametrize(
         "api_response,expected_title",
@@ -239,7 +436,7 @@ class TestIdentifyMovie:
         ],
     )
     def test_identify_movie_various_responses(
-        self, mocker, mock_anthropic_client, tmp_path, api_response, expected_title
+        self, mocker, mock_async_anthropic_client, tmp_path, api_response, expected_title
     ):
         """Test identify_movie with various API responses."""
         mock_preprocess = mocker.patch('rename_photos_ai.rename_photos.preprocess_image')
@@ -252,20 +449,317 @@ class TestIdentifyMovie:
         mock_content = mocker.MagicMock()
         mock_content.text = api_response
         mock_response.content = [mock_content]
-        mock_anthropic_client.messages.create.return_value = mock_response
+        mock_async_anthropic_client.messages.create.return_value = mock_response
 
         test_path = tmp_path / "test.jpg"
         test_path.touch()
 
-        result = identify_movie(mock_anthropic_client, test_path)
+        result = asyncio.run(identify_movie(mock_async_anthropic_client, test_path))
 
         assert result == expected_title
 
 
+@pytest.fixture
+def mock_api_server():
+    """Serve a canned Messages API response from a local HTTP server."""
+    body = json.dumps({
+        "id": "msg_123",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-sonnet-4-20250514",
+        "content": [{"type": "text", "text": "The Matrix"}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 1},
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+class TestHttpClientOptions:
+    """Tests for HTTP_CLIENT_OPTIONS against the installed anthropic SDK."""
+
+    def test_http_client_options_sync(self, mock_api_server):
+        """Test that a real sync client built with the options can make a request."""
+        http_client = anthropic.DefaultHttpxClient(**HTTP_CLIENT_OPTIONS)
+        with anthropic.Anthropic(
+            api_key="fake_api_key", base_url=mock_api_server, max_retries=0, http_client=http_client
+        ) as client:
+            message = client.messages.create(**build_message_params('encoded'))
+
+        assert message.content[0].text == "The Matrix"
+
+    def test_http_client_options_async(self, mock_api_server):
+        """Test that a real async client built with the options can make a request."""
+        async def create():
+            http_client = anthropic.DefaultAsyncHttpxClient(**HTTP_CLIENT_OPTIONS)
+            async with anthropic.AsyncAnthropic(
+                api_key="fake_api_key", base_url=mock_api_server, max_retries=0, http_client=http_client
+            ) as client:
+                return await client.messages.create(**build_message_params('encoded'))
+
+        message = asyncio.run(create())
+
+        assert message.content[0].text == "The Matrix"
+
+
+class TestIdentifyMovies:
+    """Tests for identify_movies function."""
+
+    def test_identify_movies_collects_titles_and_errors(self, mocker, tmp_path, capsys):
+        """Test that titles are returned in input order and failures are reported."""
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        paths = [tmp_path / "IMG_001.jpg", tmp_path / "IMG_002.jpg", tmp_path / "IMG_003.jpg"]
+
+        mock_preprocess = mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+
+        async def fake_identify(client, image_path, image_data=None):
+            if image_path == paths[1]:
+                raise Exception("API Error")
+            return f"Movie {image_path.stem}"
+
+        mock_identify = mocker.patch(
+            'rename_photos_ai.rename_photos.identify_movie', side_effect=fake_identify
+        )
+
+        result = asyncio.run(identify_movies("fake_api_key", paths))
+
+        assert list(result.items()) == [
+            (paths[0], "Movie IMG_001"),
+            (paths[2], "Movie IMG_003"),
+        ]
+        assert mock_identify.call_count == 3
+        assert mock_preprocess.call_count == 3
+        # Encoded images are handed to identify_movie rather than redone
+        assert all(c.args[2] is mock_preprocess.return_value for c in mock_identify.call_args_list)
+        captured = capsys.readouterr()
+        assert "Error processing IMG_002.jpg: API Error" in captured.out
+
+
+class TestFingerprintImage:
+    """Tests for fingerprint_image function."""
+
+    @pytest.mark.parametrize(
+        "size",
+        [
+            pytest.param(1000, id="small_file"),
+            pytest.param(1024 * 1024, id="large_file"),
+        ],
+    )
+    def test_fingerprint_image(self, tmp_path, size):
+        """Test that identical files match and changed files don't."""
+        data = bytes(range(256)) * (size // 256)
+        first = tmp_path / "first.jpg"
+        copy = tmp_path / "copy.jpg"
+        changed = tmp_path / "changed.jpg"
+        first.write_bytes(data)
+        copy.write_bytes(data)
+        changed.write_bytes(data[:-1] + b'x')
+
+        assert fingerprint_image(first) == fingerprint_image(copy)
+        assert fingerprint_image(first) != fingerprint_image(changed)
+
+
+@pytest.fixture
+def similar_and_different_images(tmp_path):
+    """Create an image, a resized JPEG copy of it and an unrelated image."""
+    original = tmp_path / "original.png"
+    copy = tmp_path / "copy.jpg"
+    different = tmp_path / "different.png"
+    noise = random.Random(0).randbytes(64 * 64)
+    base = Image.frombytes('L', (64, 64), noise).resize((640, 480), Image.Resampling.BICUBIC)
+    base.save(original)
+    base.resize((400, 300)).save(copy, format='JPEG', quality=70)
+    base.transpose(Image.Transpose.FLIP_LEFT_RIGHT).save(different)
+    return original, copy, different
+
+
+class TestPerceptualHash:
+    """Tests for perceptual_hash function."""
+
+    def test_perceptual_hash(self, similar_and_different_images):
+        """Test that copies hash alike and different images don't."""
+        original, copy, different = similar_and_different_images
+
+        original_hash = perceptual_hash(original)
+
+        assert (original_hash ^ perceptual_hash(copy)).bit_count() <= 5
+        assert (original_hash ^ perceptual_hash(different)).bit_count() > 5
+
+
+class TestFindDuplicateImages:
+    """Tests for find_duplicate_images function."""
+
+    def test_find_duplicate_images(self, tmp_path, similar_and_different_images):
+        """Test that duplicates map to the first image of their group."""
+        original, copy, different = similar_and_different_images
+        unreadable = tmp_path / "unreadable.jpg"
+        unreadable.write_text("not an image")
+
+        result = find_duplicate_images([original, different, unreadable, copy])
+
+        assert result == {
+            original: original,
+            different: different,
+            unreadable: unreadable,
+            copy: original,
+        }
+
+
+class TestTitleCache:
+    """Tests for load_title_cache and save_title_cache functions."""
+
+    def test_title_cache_round_trip(self, tmp_path):
+        """Test that a saved cache loads back unchanged."""
+        cache_path = tmp_path / "cache.json"
+        cache = {"abc123": "The Matrix", "def456": "Inception"}
+
+        save_title_cache(cache_path, cache)
+
+        assert load_title_cache(cache_path) == cache
+        assert list(tmp_path.iterdir()) == [cache_path]
+
+    def test_load_title_cache_missing(self, tmp_path):
+        """Test that a missing cache loads as empty."""
+        assert load_title_cache(tmp_path / "cache.json") == {}
+
+    def test_load_title_cache_corrupt(self, tmp_path, capsys):
+        """Test that a corrupt cache is ignored."""
+        cache_path = tmp_path / "cache.json"
+        cache_path.write_text("{not json")
+
+        assert load_title_cache(cache_path) == {}
+        assert "Ignoring unreadable title cache" in capsys.readouterr().out
+
+
+class TestBatchIdentifyMovies:
+    """Tests for batch_identify_movies function."""
+
+    @staticmethod
+    def _batch_response(mocker, custom_id, result_type, text=None):
+        """Build a mock individual batch response."""
+        response = mocker.MagicMock()
+        response.custom_id = custom_id
+        response.result.type = result_type
+        if text is not None:
+            mock_content = mocker.MagicMock()
+            mock_content.text = text
+            response.result.message.content = [mock_content]
+        return response
+
+    def test_batch_identify_movies_success(self, mocker, mock_anthropic_client, tmp_path):
+        """Test that batch results are mapped back to their image paths."""
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode', return_value='encoded')
+        mock_sleep = mocker.patch('rename_photos_ai.rename_photos.time.sleep')
+
+        submitted = mocker.MagicMock(id='batch_123', processing_status='in_progress')
+        ended = mocker.MagicMock(id='batch_123', processing_status='ended')
+        mock_anthropic_client.messages.batches.create.return_value = submitted
+        mock_anthropic_client.messages.batches.retrieve.return_value = ended
+        # Results are returned out of order
+        mock_anthropic_client.messages.batches.results.return_value = [
+            self._batch_response(mocker, 'image-1', 'succeeded', '  Inception  '),
+            self._batch_response(mocker, 'image-0', 'succeeded', 'The Matrix'),
+        ]
+
+        paths = [tmp_path / "IMG_001.jpg", tmp_path / "IMG_002.jpg"]
+
+        result = batch_identify_movies(mock_anthropic_client, paths)
+
+        assert result == {paths[0]: "The Matrix", paths[1]: "Inception"}
+        requests = mock_anthropic_client.messages.batches.create.call_args.kwargs['requests']
+        assert [r['custom_id'] for r in requests] == ['image-0', 'image-1']
+        mock_anthropic_client.messages.batches.retrieve.assert_called_once_with('batch_123')
+        mock_anthropic_client.messages.batches.results.assert_called_once_with('batch_123')
+        mock_sleep.assert_called_once()
+
+    def test_batch_identify_movies_failed_requests(self, mocker, mock_anthropic_client, tmp_path, capsys):
+        """Test that errored batch requests are reported and left out of the results."""
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode', return_value='encoded')
+
+        ended = mocker.MagicMock(id='batch_123', processing_status='ended')
+        mock_anthropic_client.messages.batches.create.return_value = ended
+        mock_anthropic_client.messages.batches.results.return_value = [
+            self._batch_response(mocker, 'image-0', 'errored'),
+        ]
+
+        result = batch_identify_movies(mock_anthropic_client, [tmp_path / "IMG_001.jpg"])
+
+        assert result == {}
+        captured = capsys.readouterr()
+        assert "Error processing IMG_001.jpg" in captured.out
+
+
+class TestRenamePhoto:
+    """Tests for rename_photo function."""
+
+    def test_rename_photo_copies_original(self, tmp_path):
+        """Test that the backup is an independent copy by default."""
+        image_path = tmp_path / "IMG_001.JPG"
+        image_path.write_text("fake image data")
+
+        rename_photo(image_path, "The Matrix", tmp_path, tmp_path, set(), set())
+
+        renamed = tmp_path / "The_Matrix.jpg"
+        original = tmp_path / "The_Matrix.JPG"
+        assert renamed.read_text() == original.read_text() == "fake image data"
+        assert not renamed.samefile(original)
+
+    def test_rename_photo_hardlinks_original(self, tmp_path):
+        """Test that the backup can be a hard link to the renamed photo."""
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+        image_path = tmp_path / "IMG_001.jpg"
+        image_path.write_text("fake image data")
+
+        rename_photo(
+            image_path, "The Matrix", renamed_dir, original_dir, set(), set(), hardlink_original=True
+        )
+
+        assert (renamed_dir / "The_Matrix.jpg").samefile(original_dir / "The_Matrix.jpg")
+
+    def test_rename_photo_hardlink_falls_back_to_copy(self, mocker, tmp_path):
+        """Test that the backup is copied when a hard link can't be made."""
+        mocker.patch('rename_photos_ai.rename_photos.os.link', side_effect=OSError("cross-device link"))
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+        image_path = tmp_path / "IMG_001.jpg"
+        image_path.write_text("fake image data")
+
+        rename_photo(
+            image_path, "The Matrix", renamed_dir, original_dir, set(), set(), hardlink_original=True
+        )
+
+        assert (original_dir / "The_Matrix.jpg").read_text() == "fake image data"
+        assert not (renamed_dir / "The_Matrix.jpg").samefile(original_dir / "The_Matrix.jpg")
+
+
 class TestProcessPhotos:
     """Tests for process_photos function."""
 
-    def test_process_photos_success(self, mocker, mock_anthropic_client, tmp_path):
+    def test_process_photos_success(self, mocker, tmp_path):
         """Test successful processing of photos."""
         # Create test directories
         process_dir = tmp_path / "process"
@@ -284,8 +778,8 @@ class TestProcessPhotos:
         mock_identify.return_value = "The Matrix"
 
         # Mock Anthropic client creation
-        mock_anthropic = mocker.patch('rename_photos_ai.rename_photos.Anthropic')
-        mock_anthropic.return_value = mock_anthropic_client
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
 
         process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
 
@@ -300,7 +794,7 @@ class TestProcessPhotos:
         original_file = original_dir / "The_Matrix.jpg"
         assert original_file.exists()
 
-    def test_process_photos_no_images(self, mocker, mock_anthropic_client, tmp_path, capsys):
+    def test_process_photos_no_images(self, mocker, tmp_path, capsys):
         """Test processing when no images are found."""
         process_dir = tmp_path / "process"
         renamed_dir = tmp_path / "renamed"
@@ -309,15 +803,15 @@ class TestProcessPhotos:
         renamed_dir.mkdir()
         original_dir.mkdir()
 
-        mock_anthropic = mocker.patch('rename_photos_ai.rename_photos.Anthropic')
-        mock_anthropic.return_value = mock_anthropic_client
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
 
         process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
 
         captured = capsys.readouterr()
         assert "No image files found" in captured.out
 
-    def test_process_photos_duplicate_handling(self, mocker, mock_anthropic_client, tmp_path):
+    def test_process_photos_duplicate_handling(self, mocker, tmp_path):
         """Test that duplicate filenames are handled correctly."""
         process_dir = tmp_path / "process"
         renamed_dir = tmp_path / "renamed"
@@ -337,8 +831,8 @@ class TestProcessPhotos:
         mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
         mock_identify.return_value = "The Matrix"
 
-        mock_anthropic = mocker.patch('rename_photos_ai.rename_photos.Anthropic')
-        mock_anthropic.return_value = mock_anthropic_client
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
 
         process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
 
@@ -365,7 +859,7 @@ class TestProcessPhotos:
         ],
     )
     def test_process_photos_various_extensions(
-        self, mocker, mock_anthropic_client, tmp_path, extensions
+        self, mocker, tmp_path, extensions
     ):
         """Test processing photos with various file extensions."""
         process_dir = tmp_path / "process"
@@ -383,8 +877,8 @@ class TestProcessPhotos:
         mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
         mock_identify.side_effect = [f"Movie_{i}" for i in range(len(extensions))]
 
-        mock_anthropic = mocker.patch('rename_photos_ai.rename_photos.Anthropic')
-        mock_anthropic.return_value = mock_anthropic_client
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
 
         process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
 
@@ -396,7 +890,7 @@ class TestProcessPhotos:
             renamed_file = renamed_dir / f"Movie_{i}.jpg"
             assert renamed_file.exists()
 
-    def test_process_photos_error_handling(self, mocker, mock_anthropic_client, tmp_path, capsys):
+    def test_process_photos_error_handling(self, mocker, tmp_path, capsys):
         """Test that errors during processing are handled gracefully."""
         process_dir = tmp_path / "process"
         renamed_dir = tmp_path / "renamed"
@@ -411,11 +905,184 @@ class TestProcessPhotos:
         mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
         mock_identify.side_effect = Exception("API Error")
 
-        mock_anthropic = mocker.patch('rename_photos_ai.rename_photos.Anthropic')
-        mock_anthropic.return_value = mock_anthropic_client
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
 
         process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
 
         captured = capsys.readouterr()
         assert "Error processing" in captured.out
         assert "API Error" in captured.out
+
+    def test_process_photos_batch(self, mocker, mock_anthropic_client, tmp_path):
+        """Test that batch mode identifies all photos with a single batch call."""
+        process_dir = tmp_path / "process"
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        process_dir.mkdir()
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+
+        test_image1 = process_dir / "IMG_001.jpg"
+        test_image1.write_text("fake image data 1")
+        test_image2 = process_dir / "IMG_002.png"
+        test_image2.write_text("fake image data 2")
+
+        mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
+        mock_batch = mocker.patch('rename_photos_ai.rename_photos.batch_identify_movies')
+        mock_batch.return_value = {test_image1: "The Matrix", test_image2: "Inception"}
+
+        mock_anthropic = mocker.patch('rename_photos_ai.rename_photos.Anthropic')
+        mock_anthropic.return_value.__enter__.return_value = mock_anthropic_client
+
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key", use_batch=True)
+
+        mock_batch.assert_called_once_with(mock_anthropic_client, [test_image1, test_image2])
+        mock_identify.assert_not_called()
+        assert (renamed_dir / "The_Matrix.jpg").exists()
+        assert (renamed_dir / "Inception.jpg").exists()
+        assert (original_dir / "Inception.png").exists()
+
+    def test_process_photos_uses_title_cache(self, mocker, tmp_path):
+        """Test that previously identified images are not sent to the API again."""
+        process_dir = tmp_path / "process"
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        process_dir.mkdir()
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+        mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
+        mock_identify.side_effect = ["The Matrix", "Unknown"]
+
+        (process_dir / "IMG_001.jpg").write_text("fake image data 1")
+        (process_dir / "IMG_002.jpg").write_text("fake image data 2")
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
+
+        assert mock_identify.call_count == 2
+        assert list(load_title_cache(tmp_path / "cache.json").values()) == ["The Matrix"]
+
+        # Same photos again: only the unidentified one goes back to the API
+        mock_identify.reset_mock(side_effect=True)
+        mock_identify.return_value = "Inception"
+        (process_dir / "IMG_003.jpg").write_text("fake image data 1")
+        (process_dir / "IMG_004.jpg").write_text("fake image data 2")
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
+
+        mock_identify.assert_called_once()
+        assert mock_identify.call_args[0][1] == process_dir / "IMG_004.jpg"
+        assert (renamed_dir / "The_Matrix_1.jpg").exists()
+        assert (renamed_dir / "Inception.jpg").exists()
+
+    def test_process_photos_duplicates_within_run(self, mocker, tmp_path):
+        """Test that photos of the same movie in one run get distinct names."""
+        process_dir = tmp_path / "process"
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        process_dir.mkdir()
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+
+        (original_dir / "The_Matrix.JPG").write_text("existing")
+        for i in range(3):
+            (process_dir / f"IMG_{i:03d}.JPG").write_text(f"fake image data {i}")
+
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+        mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
+        mock_identify.return_value = "The Matrix"
+
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
+
+        assert sorted(p.name for p in renamed_dir.iterdir()) == [
+            "The_Matrix.jpg", "The_Matrix_1.jpg", "The_Matrix_2.jpg"
+        ]
+        assert sorted(p.name for p in original_dir.iterdir()) == [
+            "The_Matrix.JPG", "The_Matrix_1.JPG", "The_Matrix_2.JPG", "The_Matrix_3.JPG"
+        ]
+        assert (original_dir / "The_Matrix.JPG").read_text() == "existing"
+
+    def test_process_photos_dedupe(self, mocker, tmp_path):
+        """Test that only one photo of each duplicate group is identified."""
+        process_dir = tmp_path / "process"
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        process_dir.mkdir()
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+        for i in range(3):
+            (process_dir / f"IMG_{i:03d}.jpg").write_text(f"fake image data {i}")
+
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+        mock_find = mocker.patch('rename_photos_ai.rename_photos.find_duplicate_images')
+        first = process_dir / "IMG_000.jpg"
+        mock_find.return_value = {
+            first: first,
+            process_dir / "IMG_001.jpg": first,
+            process_dir / "IMG_002.jpg": process_dir / "IMG_002.jpg",
+        }
+        mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
+        mock_identify.side_effect = ["The Matrix", "Inception"]
+
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key", dedupe=True)
+
+        assert [c.args[1].name for c in mock_identify.call_args_list] == ["IMG_000.jpg", "IMG_002.jpg"]
+        assert sorted(p.name for p in renamed_dir.iterdir()) == [
+            "Inception.jpg", "The_Matrix.jpg", "The_Matrix_1.jpg"
+        ]
+
+    def test_process_photos_fingerprint_error(self, mocker, tmp_path, capsys):
+        """Test that a file that can't be fingerprinted is still processed, uncached."""
+        process_dir = tmp_path / "process"
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        process_dir.mkdir()
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+        (process_dir / "IMG_001.jpg").write_text("fake image data 1")
+        (process_dir / "IMG_002.jpg").write_text("fake image data 2")
+
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+        mocker.patch(
+            'rename_photos_ai.rename_photos.fingerprint_image',
+            side_effect=[PermissionError("Permission denied"), "abc123"],
+        )
+        mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
+        mock_identify.side_effect = ["The Matrix", "Inception"]
+
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
+
+        captured = capsys.readouterr()
+        assert "Error fingerprinting IMG_001.jpg" in captured.out
+        assert (renamed_dir / "The_Matrix.jpg").exists()
+        assert (renamed_dir / "Inception.jpg").exists()
+        assert load_title_cache(tmp_path / "cache.json") == {"abc123": "Inception"}
+
+    def test_process_photos_cache_save_error(self, mocker, tmp_path, capsys):
+        """Test that failing to save the cache only warns and photos are still renamed."""
+        process_dir = tmp_path / "process"
+        renamed_dir = tmp_path / "renamed"
+        original_dir = tmp_path / "original"
+        process_dir.mkdir()
+        renamed_dir.mkdir()
+        original_dir.mkdir()
+        (process_dir / "IMG_001.jpg").write_text("fake image data")
+
+        mocker.patch('rename_photos_ai.rename_photos.AsyncAnthropic')
+        mocker.patch('rename_photos_ai.rename_photos.preprocess_and_encode')
+        mocker.patch(
+            'rename_photos_ai.rename_photos.save_title_cache',
+            side_effect=PermissionError("Read-only file system"),
+        )
+        mock_identify = mocker.patch('rename_photos_ai.rename_photos.identify_movie')
+        mock_identify.return_value = "The Matrix"
+
+        process_photos(process_dir, renamed_dir, original_dir, "fake_api_key")
+
+        captured = capsys.readouterr()
+        assert "Could not save title cache" in captured.out
+        assert (renamed_dir / "The_Matrix.jpg").exists()